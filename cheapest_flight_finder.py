@@ -3,6 +3,7 @@ Optimized Multi-City Cheapest Flight Finder
 ------------------------------------------
 Features:
 - Segment-wise cheapest search (fewer API calls)
+- Concurrent date searches
 - Price threshold filter
 - Option to restrict to same airline
 - SGD pricing
@@ -10,14 +11,30 @@ Features:
 - Telegram alerts with dates, airlines, Google Flights link
 """
 
+import atexit
+import datetime
+import json
+import math
 import os
 import sqlite3
+import threading
+import time
 import requests
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from itertools import product
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
-from amadeus import Client
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # orjson decodes the large offer payloads several times faster than json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 load_dotenv()
 
@@ -27,15 +44,38 @@ AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 DB_PATH = "flights.db"
+TOKEN_CACHE_PATH = ".amadeus_token.json"  # kept out of flights.db, which is tracked in git
+AMADEUS_BASE_URL = "https://test.api.amadeus.com"
+HTTP_TIMEOUT = 30  # seconds
+TELEGRAM_TIMEOUT = 5  # seconds; the price save waits on the alert
+AMADEUS_RATE_LIMIT = 10  # requests/second allowed on the test tier
+CIRCUIT_BREAKER_THRESHOLD = 3  # consecutive failed Amadeus calls before giving up for the run
+USER_AGENT = "cheapest-flight-finder/1.0"
 
 ADULTS = 1
 MAX_OFFERS = 5
 CURRENCY = "SGD"
 STEP_DAYS = 2  # check every N days in date range
+MAX_WORKERS = 8  # concurrent Amadeus searches
+# Pick each segment's date via Flight Cheapest Date Search. Only used with
+# PREFER_SAME_AIRLINE = False and a range longer than one ±3-day window (7 days),
+# or with USE_DATE_WINDOWS = False; otherwise the window searches are cheaper.
+USE_CHEAPEST_DATES = False
+SEARCH_CACHE_TTL = 3600  # seconds to reuse a stored search for the same route/date
+USE_DATE_WINDOWS = True  # sweep dates with ±N-day window searches instead of one per date
+MAX_DATE_WINDOW = 3  # Amadeus accepts windows of up to ±3 days
 
 # Filters
 MAX_PRICE = 1400  # SGD, alert only if below this
+# Skip the search when a fare this far under MAX_PRICE was recorded within the TTL.
+# Trade-off: a skipped run can't find a lower fare, so once a fare this cheap is on
+# record the next daily run is skipped and a further drop is only alerted a day later.
+# Set FAST_PATH_PRICE_RATIO = 0 to search on every run.
+FAST_PATH_PRICE_RATIO = 0.7
+FAST_PATH_TTL_HOURS = 25  # daily cron in flight_check.yml, plus slack for scheduling delays
 PREFER_SAME_AIRLINE = True  # True = ensure all segments are from the same airline
+# No single segment can cost more than the whole trip's threshold; Amadeus drops those server-side
+SEGMENT_MAX_PRICE = math.ceil(MAX_PRICE)
 
 # Multi-city itinerary with date ranges
 ITINERARY = [
@@ -44,17 +84,252 @@ ITINERARY = [
 ]
 
 # --- Data Classes ---
-@dataclass
+@dataclass(slots=True, frozen=True)
+class SlimOffer:
+    price: float
+    currency: str
+    airline: str
+    origin: str
+    destination: str
+    departure_date: str
+
+@dataclass(slots=True, frozen=True)
 class FlightOffer:
-    segments: List[Dict[str, Any]]
+    segments: List[SlimOffer]
     price: float
     dates: List[str]
 
+def slim_offer(item: Dict[str, Any]) -> SlimOffer:
+    # Keep only the fields used downstream instead of the full offer payload
+    segments = item["itineraries"][0]["segments"]
+    return SlimOffer(
+        price=float(item["price"]["total"]),
+        currency=item["price"].get("currency", CURRENCY),
+        airline=item["validatingAirlineCodes"][0],
+        origin=segments[0]["departure"]["iataCode"],
+        destination=segments[-1]["arrival"]["iataCode"],
+        departure_date=segments[0]["departure"]["at"][:10],
+    )
+
+# --- HTTP ---
+def make_session(pool_connections=8, pool_maxsize=16, retries=3, retry_post=False):
+    # Keep-alive session so repeated calls reuse the same TCP+TLS connection
+    session = requests.Session()
+    allowed_methods = Retry.DEFAULT_ALLOWED_METHODS
+    if retry_post:
+        allowed_methods = allowed_methods | {"POST"}
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=allowed_methods,
+            respect_retry_after_header=True,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+class TokenBucket:
+    # Paces calls to `rate` per second, allowing bursts of up to `burst`
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+_TG_SESSION = make_session(pool_connections=1, pool_maxsize=2, retries=2)
+
+# --- Amadeus client ---
+class AmadeusClient:
+    def __init__(self, client_id: str, client_secret: str, base_url: str = AMADEUS_BASE_URL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+        # A stored token is only valid for the account and environment that issued it
+        self.token_key = f"{client_id}@{base_url}"
+        # Amadeus POST searches and token requests are safe to repeat
+        self.session = make_session(pool_maxsize=MAX_WORKERS, retry_post=True)
+        self.rate_limiter = TokenBucket(AMADEUS_RATE_LIMIT, burst=AMADEUS_RATE_LIMIT)
+        self.token: Optional[str] = None
+        self.token_expiry = 0.0
+        self._token_lock = threading.Lock()
+        self.consecutive_failures = 0
+        self._failure_lock = threading.Lock()
+
+    def get_token(self) -> str:
+        # Concurrent searches share one token fetch
+        with self._token_lock:
+            if not self.token:
+                # Scheduled runs are separate processes; reuse a still-valid stored token
+                cached = load_token(self.token_key)
+                if cached:
+                    self.token, self.token_expiry = cached
+            if self.token and self.token_expiry - 30 > time.time():
+                return self.token
+
+            resp = self.session.post(
+                f"{self.base_url}/v1/security/oauth2/token",
+                data={
+                    "grant_type": "client_credentials",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                },
+                timeout=HTTP_TIMEOUT,
+            )
+            resp.raise_for_status()
+            body = resp.json()
+            self.token = body["access_token"]
+            self.token_expiry = time.time() + body["expires_in"]
+            store_token(self.token_key, self.token, self.token_expiry)
+            return self.token
+
+    def drop_token(self, token: str):
+        with self._token_lock:
+            # Another thread may already have replaced the rejected token
+            if self.token == token:
+                self.token = None
+                self.token_expiry = 0.0
+                clear_token(self.token_key)
+
+    def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> List[Dict[str, Any]]:
+        # Circuit breaker: once Amadeus keeps failing (after retries), stop calling it this run
+        if self.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+            raise RuntimeError(
+                f"Amadeus circuit open after {self.consecutive_failures} consecutive failures"
+            )
+
+        try:
+            for attempt in range(2):
+                token = self.get_token()
+                self.rate_limiter.take()
+                resp = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    headers={"Authorization": f"Bearer {token}", **(headers or {})},
+                    timeout=HTTP_TIMEOUT,
+                    **kwargs,
+                )
+                # A rejected token (revoked or expired early) is replaced and the call retried once
+                if resp.status_code != 401 or attempt:
+                    break
+                self.drop_token(token)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            # Only outages count; a 4xx (e.g. no cached dates for a route) is not Amadeus failing
+            status = e.response.status_code if e.response is not None else None
+            if status is None or status == 429 or status >= 500:
+                with self._failure_lock:
+                    self.consecutive_failures += 1
+            raise
+
+        with self._failure_lock:
+            self.consecutive_failures = 0
+        # Decode the raw bytes directly; skips requests' text/charset detection step
+        return json_loads(resp.content).get("data", [])
+
+    def get(self, path: str, **params) -> List[Dict[str, Any]]:
+        return self.request("GET", path, params=params)
+
+    def post(self, path: str, payload: Dict[str, Any], method_override: str = "GET") -> List[Dict[str, Any]]:
+        return self.request(
+            "POST", path, json=payload, headers={"X-HTTP-Method-Override": method_override}
+        )
+
+    def search_flights(self, origin: str, destination: str, date: str, window: int = 0) -> List[SlimOffer]:
+        if window:
+            return self.search_flights_window(origin, destination, date, window)
+
+        offers = self.get(
+            "/v2/shopping/flight-offers",
+            originLocationCode=origin,
+            destinationLocationCode=destination,
+            departureDate=date,
+            adults=ADULTS,
+            max=MAX_OFFERS,
+            currencyCode=CURRENCY,
+            maxPrice=SEGMENT_MAX_PRICE,
+        )
+        return [slim_offer(item) for item in offers]
+
+    def search_flights_window(self, origin: str, destination: str, date: str, window: int) -> List[SlimOffer]:
+        # One POST search covers date ± window days
+        offers = self.post(
+            "/v2/shopping/flight-offers",
+            {
+                "currencyCode": CURRENCY,
+                "originDestinations": [
+                    {
+                        "id": "1",
+                        "originLocationCode": origin,
+                        "destinationLocationCode": destination,
+                        "departureDateTimeRange": {"date": date, "dateWindow": f"I{window}D"},
+                    }
+                ],
+                "travelers": [
+                    {"id": str(i + 1), "travelerType": "ADULT"} for i in range(ADULTS)
+                ],
+                "sources": ["GDS"],
+                "searchCriteria": {
+                    "maxFlightOffers": MAX_OFFERS * (2 * window + 1),
+                    "maxPrice": SEGMENT_MAX_PRICE,
+                },
+            },
+        )
+        return [slim_offer(item) for item in offers]
+
+    def cheapest_dates(self, origin: str, destination: str, depart_from: str, depart_to: str) -> List[Tuple[str, float]]:
+        # Flight Cheapest Date Search: one call covers the whole date range
+        dates = self.get(
+            "/v1/shopping/flight-dates",
+            origin=origin,
+            destination=destination,
+            departureDate=f"{depart_from},{depart_to}",
+            oneWay="true",
+        )
+        return [(d["departureDate"], float(d["price"]["total"])) for d in dates]
+
+    def get_airlines(self, airline_codes: str) -> List[Dict[str, Any]]:
+        return self.get("/v1/reference-data/airlines", airlineCodes=airline_codes)
+
 # --- DB helpers ---
+_CONN: Optional[sqlite3.Connection] = None
+
+def close_db():
+    # Lets SQLite refresh planner statistics for tables that changed this run
+    _CONN.execute("PRAGMA optimize")
+    _CONN.close()
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
+    # One long-lived connection; sqlite3 keeps compiled statements in its cache
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=128)
+        atexit.register(close_db)
+        # Append-mostly workload: WAL + NORMAL sync avoids an fsync per INSERT
+        _CONN.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=134217728;
+            PRAGMA cache_size=-20000;
+        """)
+
+    _CONN.execute("""
         CREATE TABLE IF NOT EXISTS cheapest_flights (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             itinerary TEXT,
@@ -62,184 +337,454 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    cur.execute("""
+    # Covers MIN(price) WHERE itinerary=? in get_prev_best
+    _CONN.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cheapest_itin ON cheapest_flights(itinerary, price)"
+    )
+    _CONN.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cheapest_created ON cheapest_flights(created_at)"
+    )
+    # Gather statistics once so the planner knows the index's selectivity
+    if not _CONN.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'"
+    ).fetchone():
+        _CONN.execute("ANALYZE")
+    _CONN.execute("""
         CREATE TABLE IF NOT EXISTS airlines (
             code TEXT PRIMARY KEY,
             name TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+    # Bearer tokens no longer live in the tracked database
+    _CONN.execute("DROP TABLE IF EXISTS auth")
+    # Rows cached before the search parameters were part of the key can't be trusted
+    if "search_params" not in {
+        column[1] for column in _CONN.execute("PRAGMA table_info(search_cache)")
+    }:
+        _CONN.execute("DROP TABLE IF EXISTS search_cache")
+    _CONN.execute("""
+        CREATE TABLE IF NOT EXISTS search_cache (
+            origin TEXT,
+            destination TEXT,
+            departure_date TEXT,
+            date_window INTEGER,
+            search_params TEXT,
+            offer_data TEXT,
+            checked_at REAL,
+            PRIMARY KEY (origin, destination, departure_date, date_window, search_params)
+        )
+    """)
+    _CONN.execute("""
+        CREATE TABLE IF NOT EXISTS date_cache (
+            origin TEXT,
+            destination TEXT,
+            depart_from TEXT,
+            depart_to TEXT,
+            date_data TEXT,
+            checked_at REAL,
+            PRIMARY KEY (origin, destination, depart_from, depart_to)
+        )
+    """)
+    _CONN.commit()
 
 def get_prev_best(itinerary_key: str) -> Optional[float]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT MIN(price) FROM cheapest_flights WHERE itinerary=?", (itinerary_key,))
-    row = cur.fetchone()
-    conn.close()
+    row = _CONN.execute(
+        "SELECT MIN(price) FROM cheapest_flights WHERE itinerary=?", (itinerary_key,)
+    ).fetchone()
     return row[0] if row and row[0] else None
 
-def save_offer(itinerary_key: str, price: float):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO cheapest_flights (itinerary, price) VALUES (?,?)", (itinerary_key, price))
-    conn.commit()
-    conn.close()
+def get_recent_best(itinerary_keys: List[str], hours: float) -> Optional[Tuple[str, float, str]]:
+    # created_at is SQLite's UTC CURRENT_TIMESTAMP, so compare against datetime('now')
+    placeholders = ",".join("?" * len(itinerary_keys))
+    return _CONN.execute(
+        f"""
+        SELECT itinerary, price, created_at FROM cheapest_flights
+        WHERE created_at > datetime('now', ?) AND itinerary IN ({placeholders})
+        ORDER BY price LIMIT 1
+        """,
+        (f"-{hours} hours", *itinerary_keys),
+    ).fetchone()
+
+def save_offers(rows: List[Tuple[str, float]], alert: Callable[[List[int]], None]):
+    # Read the previous bests, alert on new lows and insert the new prices in one write
+    # transaction: overlapping runs can't both alert on the same low, and if the alert
+    # raises the insert is rolled back so the next run alerts again
+    with _CONN:
+        _CONN.execute("BEGIN IMMEDIATE")
+        new_lows = []
+        for idx, (itinerary_key, price) in enumerate(rows):
+            prev_best = get_prev_best(itinerary_key)
+            if prev_best is None or price < prev_best:
+                new_lows.append(idx)
+        if new_lows:
+            alert(new_lows)
+        _CONN.executemany("INSERT INTO cheapest_flights (itinerary, price) VALUES (?,?)", rows)
+
+def search_params_key() -> str:
+    # Everything besides route and date that changes which offers a search returns
+    return f"adults={ADULTS};currency={CURRENCY};max={MAX_OFFERS};maxPrice={SEGMENT_MAX_PRICE}"
+
+def load_cached_offers(
+    origin: str, destination: str, departure_date: str, date_window: int, fresh_after: float
+) -> Optional[List[SlimOffer]]:
+    row = _CONN.execute(
+        """
+        SELECT offer_data FROM search_cache
+        WHERE origin=? AND destination=? AND departure_date=? AND date_window=?
+            AND search_params=? AND checked_at > ?
+        """,
+        (origin, destination, departure_date, date_window, search_params_key(), fresh_after),
+    ).fetchone()
+    return [SlimOffer(**o) for o in json_loads(row[0])] if row else None
+
+def save_cached_offers(rows: List[Tuple[str, str, str, int, List[SlimOffer]]], checked_at: float):
+    search_params = search_params_key()
+    with _CONN:
+        _CONN.executemany(
+            """
+            INSERT OR REPLACE INTO search_cache
+                (origin, destination, departure_date, date_window, search_params, offer_data, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    origin,
+                    destination,
+                    departure_date,
+                    date_window,
+                    search_params,
+                    json.dumps([asdict(o) for o in offers], separators=(",", ":")),
+                    checked_at,
+                )
+                for origin, destination, departure_date, date_window, offers in rows
+            ],
+        )
 
-# --- Airline helpers ---
-def get_airline_name(amadeus_client, airline_code: str) -> str:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM airlines WHERE code=?", (airline_code,))
-    row = cur.fetchone()
-    if row:
-        conn.close()
-        return row[0]
+def load_cached_dates(
+    origin: str, destination: str, depart_from: str, depart_to: str, fresh_after: float
+) -> Optional[List[Tuple[str, float]]]:
+    row = _CONN.execute(
+        """
+        SELECT date_data FROM date_cache
+        WHERE origin=? AND destination=? AND depart_from=? AND depart_to=? AND checked_at > ?
+        """,
+        (origin, destination, depart_from, depart_to, fresh_after),
+    ).fetchone()
+    return [(date, price) for date, price in json_loads(row[0])] if row else None
+
+def save_cached_dates(
+    origin: str,
+    destination: str,
+    depart_from: str,
+    depart_to: str,
+    priced_dates: List[Tuple[str, float]],
+    checked_at: float,
+):
+    with _CONN:
+        _CONN.execute(
+            """
+            INSERT OR REPLACE INTO date_cache
+                (origin, destination, depart_from, depart_to, date_data, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                origin,
+                destination,
+                depart_from,
+                depart_to,
+                json.dumps(priced_dates, separators=(",", ":")),
+                checked_at,
+            ),
+        )
 
+# --- Token cache ---
+def load_token(key: str) -> Optional[Tuple[str, float]]:
     try:
-        response = amadeus_client.reference_data.airlines.get(airlineCodes=airline_code)
-        if response.data:
-            airline_name = (
-                response.data[0].get("businessName")
-                or response.data[0].get("commonName")
-                or airline_code
-            )
-            cur.execute(
-                "INSERT OR REPLACE INTO airlines (code, name) VALUES (?, ?)",
-                (airline_code, airline_name),
-            )
-            conn.commit()
-            conn.close()
-            return airline_name
-    except Exception as e:
-        print(f"Error fetching airline name for {airline_code}: {e}")
+        with open(TOKEN_CACHE_PATH, "rb") as f:
+            cached = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != key:
+        return None
+    return cached["token"], cached["expiry"]
+
+def store_token(key: str, token: str, expiry: float):
+    # Owner-only file, swapped in atomically so a reader never sees a partial write
+    tmp_path = f"{TOKEN_CACHE_PATH}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"key": key, "token": token, "expiry": expiry}, f)
+    os.replace(tmp_path, TOKEN_CACHE_PATH)
+
+def clear_token(key: str):
+    if load_token(key) is not None:
+        os.remove(TOKEN_CACHE_PATH)
 
-    conn.close()
-    return airline_code
-
-# --- Telegram ---
-def send_telegram_alert(amadeus, flight_offer: FlightOffer):
-    message_lines = ["🛫 *Suggested Cheapest Multi-City Flight!*"]
-    itinerary_link_parts = []
-
-    for idx, seg_data in enumerate(flight_offer.segments):
-        airline_code = seg_data["validatingAirlineCodes"][0]
-        airline_name = get_airline_name(amadeus, airline_code)
-        origin = seg_data["itineraries"][0]["segments"][0]["departure"]["iataCode"]
-        destination = seg_data["itineraries"][0]["segments"][-1]["arrival"]["iataCode"]
-        departure_date = seg_data["itineraries"][0]["segments"][0]["departure"]["at"][:10]
-
-        message_lines.append(
-            f"Segment {idx+1}: {origin} → {destination} | {airline_name} ({airline_code}) | {departure_date}"
+# --- Airline helpers ---
+_airline_cache: Dict[str, str] = {}  # code -> name, filled from SQLite/Amadeus
+
+def get_airline_names(amadeus_client, airline_codes: List[str]) -> Dict[str, str]:
+    codes = list(dict.fromkeys(airline_codes))
+    # Codes seen earlier in this process skip SQLite entirely
+    unknown = [code for code in codes if code not in _airline_cache]
+    if unknown:
+        placeholders = ",".join("?" * len(unknown))
+        _airline_cache.update(
+            _CONN.execute(
+                f"SELECT code, name FROM airlines WHERE code IN ({placeholders})", unknown
+            ).fetchall()
         )
-        itinerary_link_parts.append(f"{origin}.{destination}.{departure_date}")
 
-    message_lines.append(f"💰 Total Price: {CURRENCY} {flight_offer.price}")
-    booking_link = "https://www.google.com/flights?hl=en#flt=" + "*".join(itinerary_link_parts)
-    message_lines.append(f"[🔗 Book here]({booking_link})")
+    # Resolve every cache miss with a single reference-data call
+    missing = [code for code in unknown if code not in _airline_cache]
+    if missing:
+        try:
+            new_rows = []
+            for airline in amadeus_client.get_airlines(",".join(missing)):
+                code = airline.get("iataCode")
+                if code in missing:
+                    name = airline.get("businessName") or airline.get("commonName") or code
+                    _airline_cache[code] = name
+                    new_rows.append((code, name))
+            with _CONN:
+                _CONN.executemany(
+                    "INSERT OR IGNORE INTO airlines (code, name) VALUES (?, ?)", new_rows
+                )
+        except Exception as e:
+            print(f"Error fetching airline names for {','.join(missing)}: {e}")
+
+    return {code: _airline_cache.get(code, code) for code in codes}
 
-    message = "\n".join(message_lines)
+# --- Telegram ---
+def send_telegram_message(message: str):
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "Markdown"}
-    requests.post(url, data=payload)
+    _TG_SESSION.post(url, data=payload, timeout=TELEGRAM_TIMEOUT).raise_for_status()
+
+def format_alert(flight_offer: FlightOffer, airline_names: Dict[str, str]) -> str:
+    segments = flight_offer.segments
+    booking_link = "https://www.google.com/flights?hl=en#flt=" + "*".join(
+        f"{seg.origin}.{seg.destination}.{seg.departure_date}" for seg in segments
+    )
+    return "\n".join(
+        [
+            "🛫 *Suggested Cheapest Multi-City Flight!*",
+            *(
+                f"Segment {idx}: {seg.origin} → {seg.destination} | "
+                f"{airline_names[seg.airline]} ({seg.airline}) | {seg.departure_date}"
+                for idx, seg in enumerate(segments, start=1)
+            ),
+            f"💰 Total Price: {CURRENCY} {flight_offer.price}",
+            f"[🔗 Book here]({booking_link})",
+        ]
+    )
+
+def send_telegram_alert(flight_offers: List[FlightOffer], airline_names: Dict[str, str]):
+    # One Telegram message for all new lows of the run
+    send_telegram_message(
+        "\n\n".join(format_alert(flight_offer, airline_names) for flight_offer in flight_offers)
+    )
 
 # --- Date helpers ---
+@lru_cache(maxsize=None)
+def _date_range(start_date: str, days_range: int, step: int) -> Tuple[str, ...]:
+    base = datetime.date.fromisoformat(start_date).toordinal()
+    return tuple(
+        datetime.date.fromordinal(base + i).isoformat()
+        for i in range(0, days_range, step)
+    )
+
 def generate_date_options(segment, step=1):
-    start = datetime.strptime(segment["start_date"], "%Y-%m-%d")
+    # Segments are plain dicts, so memoize on their hashable fields
+    return _date_range(segment["start_date"], segment["days_range"], step)
+
+# --- Optimized Segment-wise Cheapest Search ---
+def date_windows(seg) -> List[Tuple[str, int]]:
+    # Cover every day in the range with as few (center date, ±days) searches as possible
+    all_dates = generate_date_options(seg)
+    size = 2 * MAX_DATE_WINDOW + 1
     return [
-        (start + timedelta(days=i)).strftime("%Y-%m-%d")
-        for i in range(0, segment["days_range"], step)
+        (chunk[len(chunk) // 2], len(chunk) // 2)
+        for chunk in (all_dates[i : i + size] for i in range(0, len(all_dates), size))
     ]
 
-# --- Optimized Segment-wise Cheapest Search ---
+def date_options(seg, step=STEP_DAYS) -> List[Tuple[str, int]]:
+    if USE_DATE_WINDOWS:
+        return date_windows(seg)
+    return [(date, 0) for date in generate_date_options(seg, step=step)]
+
+def needs_date_lookup(options: List[Tuple[str, int]]) -> bool:
+    # The cheapest date ignores airline; same-airline matching needs every date's offers.
+    # A single window search already covers the range for less than lookup + search.
+    return USE_CHEAPEST_DATES and not PREFER_SAME_AIRLINE and len(options) > 1
+
+def candidate_dates(seg, priced_dates: List[Tuple[str, float]], options: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    all_dates = generate_date_options(seg)
+    priced = [(date, price) for date, price in priced_dates if date in all_dates]
+    if not priced:
+        return options
+    return [(min(priced, key=lambda x: x[1])[0], 0)]
+
 def find_cheapest_per_segment(amadeus_client, step=STEP_DAYS):
     segment_cheapest = []
-
-    for seg in ITINERARY:
-        airline_best: Dict[str, Dict] = {}
-        for date in generate_date_options(seg, step=step):
-            try:
-                response = amadeus_client.shopping.flight_offers_search.get(
-                    originLocationCode=seg["origin"],
-                    destinationLocationCode=seg["destination"],
-                    departureDate=date,
-                    adults=ADULTS,
-                    max=MAX_OFFERS,
-                    currencyCode=CURRENCY,
+    to_cache = []
+    run_ts = time.time()  # one timestamp for every cache read/write in this sweep
+    fresh_after = run_ts - SEARCH_CACHE_TTL
+
+    # Searches are I/O-bound, so fire every (segment, date) query at once.
+    # Workers only call Amadeus; all SQLite access stays on this thread.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        pending: List[List[Tuple[str, Future]]] = [[] for _ in ITINERARY]
+
+        def queue_searches(idx, dates):
+            seg = ITINERARY[idx]
+            for date, window in dates:
+                # Reuse a recent result for the same route and date
+                cached = load_cached_offers(
+                    seg["origin"], seg["destination"], date, window, fresh_after
                 )
-                offers = response.data
-                if not offers:
-                    continue
-
-                for offer in offers:
-                    airline_code = offer["validatingAirlineCodes"][0]
-                    price = float(offer["price"]["total"])
-                    if (
-                        airline_code not in airline_best
-                        or price < airline_best[airline_code]["price"]
-                    ):
-                        airline_best[airline_code] = {
-                            "offer": offer,
-                            "price": price,
-                            "date": date,
-                        }
+                if cached is not None:
+                    future = Future()
+                    future.set_result(cached)
+                else:
+                    future = pool.submit(
+                        amadeus_client.search_flights,
+                        seg["origin"],
+                        seg["destination"],
+                        date,
+                        window,
+                    )
+                    to_cache.append((seg["origin"], seg["destination"], date, window, future))
+                pending[idx].append((date, future))
+
+        options = [date_options(seg, step) for seg in ITINERARY]
+        routes: Dict[int, Tuple[str, str, str, str]] = {}
+        dates_pending: Dict[Future, int] = {}
+        for idx, seg in enumerate(ITINERARY):
+            if not needs_date_lookup(options[idx]):
+                queue_searches(idx, options[idx])
+                continue
+            all_dates = generate_date_options(seg)
+            routes[idx] = (seg["origin"], seg["destination"], all_dates[0], all_dates[-1])
+            # Reuse a recent date lookup for the same route and range
+            cached = load_cached_dates(*routes[idx], fresh_after=fresh_after)
+            if cached is not None:
+                queue_searches(idx, candidate_dates(seg, cached, options[idx]))
+            else:
+                dates_pending[pool.submit(amadeus_client.cheapest_dates, *routes[idx])] = idx
+
+        # Queue each segment's searches as soon as its own date lookup returns
+        for lookup in as_completed(dates_pending):
+            idx = dates_pending[lookup]
+            seg = ITINERARY[idx]
+            try:
+                priced_dates = lookup.result()
             except Exception as e:
                 print(
-                    f"Error searching {seg['origin']}→{seg['destination']} on {date}: {e}"
+                    f"Error in date search {seg['origin']}→{seg['destination']}, sweeping dates instead: {e}"
+                )
+                queue_searches(idx, options[idx])
+                continue
+            save_cached_dates(*routes[idx], priced_dates, checked_at=run_ts)
+            queue_searches(idx, candidate_dates(seg, priced_dates, options[idx]))
+
+        for seg, seg_pending in zip(ITINERARY, pending):
+            all_dates = generate_date_options(seg)
+            seg_offers: List[SlimOffer] = []  # across every searched date
+            for date, future in seg_pending:
+                try:
+                    offers = future.result()
+                except Exception as e:
+                    print(
+                        f"Error searching {seg['origin']}→{seg['destination']} around {date}: {e}"
+                    )
+                    continue
+                # Window searches can reach past the segment's range
+                seg_offers.extend(
+                    offer
+                    for offer in offers
+                    if all_dates[0] <= offer.departure_date <= all_dates[-1]
                 )
 
-        if PREFER_SAME_AIRLINE:
-            segment_cheapest.append(list(airline_best.values()))
-        else:
-            best = min(airline_best.values(), key=lambda x: x["price"], default=None)
-            segment_cheapest.append(best)
+            if PREFER_SAME_AIRLINE:
+                # Sorted ascending, so the first offer seen per airline is its cheapest
+                seg_offers.sort(key=lambda offer: offer.price)
+                airline_best: Dict[str, SlimOffer] = {}
+                for offer in seg_offers:
+                    airline_best.setdefault(offer.airline, offer)
+                segment_cheapest.append(list(airline_best.values()))
+            else:
+                # Single reduction over the flattened offers
+                segment_cheapest.append(
+                    min(seg_offers, key=lambda offer: offer.price, default=None)
+                )
 
+    save_cached_offers(
+        [
+            (origin, destination, date, window, future.result())
+            for origin, destination, date, window, future in to_cache
+            if future.exception() is None
+        ],
+        checked_at=run_ts,
+    )
     return segment_cheapest
 
 # --- Combine Segments ---
 def combine_segments(segment_results):
     if PREFER_SAME_AIRLINE:
-        # intersect airlines across all segments
-        airline_sets = [
-            set([s["offer"]["validatingAirlineCodes"][0] for s in segs])
-            for segs in segment_results
-        ]
-        common_airlines = set.intersection(*airline_sets)
-        best_offer = None
-        best_price = float("inf")
-
-        for airline in common_airlines:
-            chosen_segments = []
-            total_price = 0
-            dates = []
-            for segs in segment_results:
-                seg = min(
-                    [s for s in segs if s["offer"]["validatingAirlineCodes"][0] == airline],
-                    key=lambda x: x["price"],
-                )
-                chosen_segments.append(seg["offer"])
-                total_price += seg["price"]
-                dates.append(seg["date"])
-            if total_price < best_price:
-                best_price = total_price
-                best_offer = FlightOffer(
-                    segments=chosen_segments, price=total_price, dates=dates
-                )
-
-        return best_offer
+        # Single pass: running total and legs per airline. Each segment already
+        # holds one (cheapest) entry per airline, so legs stay in segment order.
+        totals: Dict[str, list] = defaultdict(lambda: [0.0, []])
+        for segs in segment_results:
+            for seg in segs:
+                total = totals[seg.airline]
+                total[0] += seg.price
+                total[1].append(seg)
+
+        # Only airlines that fly every segment qualify
+        complete = [t for t in totals.values() if len(t[1]) == len(segment_results)]
+        if not complete:
+            return None
+        total_price, chosen = min(complete, key=lambda t: t[0])
+        return FlightOffer(
+            segments=chosen,
+            price=total_price,
+            dates=[seg.departure_date for seg in chosen],
+        )
     else:
-        chosen_segments = [seg["offer"] for seg in segment_results if seg]
-        total_price = sum(float(seg["price"]["total"]) for seg in chosen_segments)
-        dates = [
-            seg["itineraries"][0]["segments"][0]["departure"]["at"][:10]
-            for seg in chosen_segments
-        ]
+        chosen_segments = [seg for seg in segment_results if seg]
+        total_price = sum(seg.price for seg in chosen_segments)
+        dates = [seg.departure_date for seg in chosen_segments]
         return FlightOffer(segments=chosen_segments, price=total_price, dates=dates)
 
 # --- Runner ---
+_ITINERARY_PREFIXES = [f"{seg['origin']}->{seg['destination']}:" for seg in ITINERARY]
+
+def make_itinerary_key(dates: List[str]) -> str:
+    return "-".join(prefix + date for prefix, date in zip(_ITINERARY_PREFIXES, dates))
+
+def itinerary_keys() -> List[str]:
+    # Every key a run over the configured date ranges can save; rows for other
+    # dates (e.g. before the trip dates were edited) don't describe this trip
+    return [
+        make_itinerary_key(dates)
+        for dates in product(*(generate_date_options(seg) for seg in ITINERARY))
+    ]
+
 def run_check():
     init_db()
-    amadeus_client = Client(
+
+    # Cache-first: a recent, clearly cheap fare makes a fresh search pointless
+    recent = get_recent_best(itinerary_keys(), FAST_PATH_TTL_HOURS)
+    if recent and recent[1] <= MAX_PRICE * FAST_PATH_PRICE_RATIO:
+        itinerary_key, price, created_at = recent
+        print(
+            f"Recent fare {CURRENCY} {price} for {itinerary_key} recorded at {created_at} UTC; "
+            "skipping search, so a lower fare won't be found this run."
+        )
+        return
+
+    amadeus_client = AmadeusClient(
         client_id=AMADEUS_CLIENT_ID, client_secret=AMADEUS_CLIENT_SECRET
     )
 
@@ -249,24 +794,33 @@ def run_check():
         return
 
     best_offer = combine_segments(segment_results)
+    candidates: List[FlightOffer] = []
+    to_save: List[Tuple[str, float]] = []
 
     if best_offer and best_offer.price <= MAX_PRICE:
-        itinerary_key = "-".join(
-            [
-                f"{seg['origin']}->{seg['destination']}:{date}"
-                for seg, date in zip(ITINERARY, best_offer.dates)
-            ]
-        )
-        prev_best = get_prev_best(itinerary_key)
-
-        if prev_best is None or best_offer.price < prev_best:
-            send_telegram_alert(amadeus_client, best_offer)
-
-        save_offer(itinerary_key, best_offer.price)
+        candidates.append(best_offer)
+        to_save.append((make_itinerary_key(best_offer.dates), best_offer.price))
     else:
         print(
             "No offers found below threshold or matching airline preference."
         )
 
+    if to_save:
+        # Resolved up front: the lookup commits its own cache rows, which would end
+        # save_offers' transaction early
+        airline_names = get_airline_names(
+            amadeus_client,
+            [seg.airline for flight_offer in candidates for seg in flight_offer.segments],
+        )
+        try:
+            save_offers(
+                to_save,
+                lambda new_lows: send_telegram_alert(
+                    [candidates[idx] for idx in new_lows], airline_names
+                ),
+            )
+        except requests.RequestException as e:
+            print(f"Error sending Telegram alert, prices not saved so the next run retries: {e}")
+
 if __name__ == "__main__":
     run_check()